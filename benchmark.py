@@ -0,0 +1,567 @@
+import os
+import sys
+import time
+import math
+import subprocess
+import socket
+import tempfile
+import json
+import platform
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from io import BytesIO
+from typing import List, Tuple
+from PIL import Image
+
+import main
+
+
+def synthetic_image(height: int, width: int, seed: int = 0) -> np.ndarray:
+    """
+    Create a deterministic test image with smooth gradients and a few
+    high-contrast shapes, so seam carving has both cheap and expensive
+    regions to work with.
+
+    Args:
+        height (int): Image height
+        width (int): Image width
+        seed (int): Random seed for the shape placement
+
+    Returns:
+        np.ndarray: uint8 RGB image with shape (height, width, 3)
+    """
+    rng = np.random.default_rng(seed)
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    img = np.stack([
+        127 + 127 * np.sin(x / max(width, 1) * math.pi * 2),
+        127 + 127 * np.cos(y / max(height, 1) * math.pi * 3),
+        (x + y) / (width + height) * 255,
+    ], axis=-1)
+    for _ in range(6):
+        cy, cx = rng.integers(0, height), rng.integers(0, width)
+        radius = rng.integers(max(height, width) // 16 + 1,
+                              max(height, width) // 6 + 2)
+        img[(y - cy) ** 2 + (x - cx) ** 2 < radius ** 2] = rng.integers(0, 256, 3)
+    return img.astype(np.uint8)
+
+
+def synthetic_gif(num_frames: int, height: int, width: int, seed: int = 0) -> List[np.ndarray]:
+    """
+    Create a deterministic animation: a static synthetic_image background
+    with a square moving across it.
+    """
+    background = synthetic_image(height, width, seed)
+    side = max(min(height, width) // 5, 1)
+    frames = []
+    for i in range(num_frames):
+        frame = background.copy()
+        x = (width - side) * i // max(num_frames - 1, 1)
+        frame[(height - side) // 2:(height + side) // 2, x:x + side] = (255, 255, 0)
+        frames.append(frame)
+    return frames
+
+
+def schedule(num_frames: int, min_scale: float = 0.0) -> List[float]:
+    """
+    Sine scale schedule, the same one process_frames uses for method 2.
+    """
+    return [min_scale + (1-min_scale)*math.cos(x) for x in np.arange(
+        0, math.pi/2, (math.pi/2)/num_frames)]
+
+
+def bench_progressive(frame_counts: List[int] = (5, 10, 20, 40), size: int = 96):
+    """
+    Compare the exact and progressive engines of multiprocess_frames on a
+    static image for a range of frame counts, printing the wall time of each
+    engine, the speedup and the mean absolute pixel difference.
+    """
+    img = synthetic_image(size, size)
+    resolution = img.shape[:2]
+    print(f"{'frames':>6} {'exact s':>9} {'progressive s':>14} {'speedup':>8} {'mean diff':>10}")
+    for num_frames in frame_counts:
+        scales = schedule(num_frames)
+        results = {}
+        timings = {}
+        for engine in ("exact", "progressive"):
+            start = time.perf_counter()
+            results[engine] = main.multiprocess_frames(
+                num_frames, ".png", img, resolution, scales, engine)
+            timings[engine] = time.perf_counter() - start
+        diff = np.mean([np.abs(np.asarray(a, dtype=np.int16) - np.asarray(b, dtype=np.int16)).mean()
+                        for a, b in zip(results["exact"], results["progressive"])])
+        print(f"{num_frames:>6} {timings['exact']:>9.2f} {timings['progressive']:>14.2f} "
+              f"{timings['exact'] / timings['progressive']:>7.1f}x {diff:>10.2f}")
+
+
+def bench_kernel(scales: List[float] = (0.8, 0.5, 0.0), size: Tuple[int, int] = (256, 427)):
+    """
+    Compare the library and incremental kernels of seam_carving_meme on a
+    single static image for a few scales, printing the wall time of each
+    kernel and the mean absolute pixel difference.
+    """
+    img = synthetic_image(*size)
+    print(f"{'scale':>6} {'library s':>10} {'incremental s':>14} {'speedup':>8} {'mean diff':>10}")
+    for scale in scales:
+        results = {}
+        timings = {}
+        for kernel in main.KERNELS:
+            start = time.perf_counter()
+            results[kernel] = main.seam_carving_meme(img, scale, size, kernel)
+            timings[kernel] = time.perf_counter() - start
+        diff = np.abs(results["library"].astype(np.int16) - results["incremental"]).mean()
+        print(f"{scale:>6.2f} {timings['library']:>10.2f} {timings['incremental']:>14.2f} "
+              f"{timings['library'] / timings['incremental']:>7.1f}x {diff:>10.2f}")
+
+
+def bench_pyramid(qualities: List[float] = (0.0, 0.25, 0.5, 1.0), scales: List[float] = (0.8, 0.5, 0.2), size: Tuple[int, int] = (256, 427), shape: Tuple[int, int] = (44, 44)):
+    """
+    Compare the pyramid kernel at several quality values against the exact
+    library kernel, carving a large image to a small output. Prints the
+    total wall time over `scales` and the mean absolute difference of the
+    final output frames.
+    """
+    img = synthetic_image(*size)
+    start = time.perf_counter()
+    exact = [main.seam_carving_meme(img, scale, shape, "library") for scale in scales]
+    exact_seconds = time.perf_counter() - start
+    print(f"{'kernel':>16} {'seconds':>8} {'speedup':>8} {'mean diff':>10}")
+    print(f"{'library':>16} {exact_seconds:>8.2f} {1:>7.1f}x {0:>10.2f}")
+    for quality in qualities:
+        start = time.perf_counter()
+        frames = [main.seam_carving_meme(img, scale, shape, "pyramid", quality) for scale in scales]
+        seconds = time.perf_counter() - start
+        diff = np.mean([np.abs(a.astype(np.int16) - b).mean() for a, b in zip(exact, frames)])
+        print(f"{f'pyramid q={quality}':>16} {seconds:>8.2f} {exact_seconds / seconds:>7.1f}x {diff:>10.2f}")
+
+
+def bench_batch(batch_sizes: List[int] = (1, 4, 8, 16), size: Tuple[int, int] = (128, 171), num_frames: int = 16):
+    """
+    Compare the throughput of one core, in carved frames per second, of
+    seam_carving.resize (the library kernel), the incremental kernel and
+    carve_batch at several batch sizes, on the frames of an animation. Each
+    is run with every frame carved to the same scale and with the sine
+    schedule, and the batches of the schedule are taken in order of scale
+    like multiprocess_frames does.
+    """
+    frames = synthetic_gif(num_frames, *size)
+    for kernel in ("library", "batch"):
+        main.carve_frame(frames[0], 0.9, size, kernel)
+    for label, scales in (("scale 0.5", [0.5] * num_frames), ("schedule", schedule(num_frames))):
+        sizes = [main.carve_size(size, scale) for scale in scales]
+        rates = {}
+        start = time.perf_counter()
+        for frame, scale in zip(frames, scales):
+            main.carve_frame(frame, scale, size, "library")
+        rates["library"] = num_frames / (time.perf_counter() - start)
+        start = time.perf_counter()
+        for frame, (height, width) in zip(frames, sizes):
+            main.carve_image(frame, height, width)
+        rates["incremental"] = num_frames / (time.perf_counter() - start)
+        for batch_size in batch_sizes:
+            start = time.perf_counter()
+            for batch in main.batch_tasks(frames, list(enumerate(scales)), 1, batch_size):
+                main.carve_batch([frames[i] for i in batch], [sizes[i] for i in batch])
+            rates[f"batch {batch_size}"] = num_frames / (time.perf_counter() - start)
+        print(f"{label}: " + ", ".join(f"{name} {rate:.1f} frames/s" for name, rate in rates.items()))
+
+
+def bench_resize(num_frames: int = 16, size: Tuple[int, int] = (256, 427), shapes: List[Tuple[int, int]] = ((256, 427), (64, 64), (44, 44))):
+    """
+    Compare the resize methods of resize_frames on the carved frames of a
+    static image, resizing them to a few output shapes. Prints the time per
+    frame of each method and the mean and largest difference to the
+    "skimage" method, which is what seam_carving_meme used to do.
+    """
+    img = synthetic_image(*size)
+    carved = [main.carve_frame(img, scale, size, "incremental") for scale in schedule(num_frames)]
+    print(f"{'shape':>10} {'method':>10} {'ms/frame':>9} {'speedup':>8} {'mean diff':>10} {'max diff':>9}")
+    for shape in shapes:
+        results = {}
+        timings = {}
+        for method in main.RESIZE_METHODS:
+            main.resize_frames(carved, shape, method)
+            start = time.perf_counter()
+            results[method] = main.resize_frames(carved, shape, method)
+            timings[method] = (time.perf_counter() - start) / num_frames
+        for method in main.RESIZE_METHODS:
+            diffs = [np.abs(a.astype(np.int16) - b) for a, b in zip(results["skimage"], results[method])]
+            print(f"{'x'.join(map(str, shape)):>10} {method:>10} {timings[method] * 1000:>9.2f} "
+                  f"{timings['skimage'] / timings[method]:>7.1f}x {np.mean([d.mean() for d in diffs]):>10.3f} "
+                  f"{max(d.max() for d in diffs):>9}")
+
+
+def bench_encode(num_frames: int = 20, size: Tuple[int, int] = (256, 427)):
+    """
+    Compare the serial Image.save encoder with encode_gif on looping carved
+    frames, printing the wall time and output size of each.
+    """
+    img = synthetic_image(*size)
+    frames = [main.seam_carving_meme(img, scale, size, "pyramid", 0.0) for scale in schedule(num_frames)]
+    imgs = [Image.fromarray(frame) for frame in frames]
+    imgs += imgs[-2:0:-1]
+    start = time.perf_counter()
+    buffer = BytesIO()
+    imgs[0].save(buffer, format="GIF", save_all=True, append_images=imgs[1:],
+                 duration=50, loop=0, optimize=True)
+    save_seconds = time.perf_counter() - start
+    start = time.perf_counter()
+    data = main.encode_gif(frames, 50, True)
+    encode_seconds = time.perf_counter() - start
+    print(f"{'encoder':>12} {'seconds':>8} {'KB':>8}")
+    print(f"{'Image.save':>12} {save_seconds:>8.2f} {len(buffer.getvalue()) / 1024:>8.0f}")
+    print(f"{'encode_gif':>12} {encode_seconds:>8.2f} {len(data) / 1024:>8.0f}")
+
+
+def bench_formats(num_frames: int = 20, size: Tuple[int, int] = (256, 427)):
+    """
+    Compare the output formats of save_animation with Pillow's own encoders
+    on looping carved frames, printing the wall time, size and bytes per
+    output frame of each.
+    """
+    img = synthetic_image(*size)
+    frames = [main.seam_carving_meme(img, scale, size, "pyramid", 0.0) for scale in schedule(num_frames)]
+    imgs = [Image.fromarray(frame) for frame in frames]
+    imgs += imgs[-2:0:-1]
+    encoders = {
+        "Image.save webp": lambda: save_with_pillow(imgs, "WEBP", quality=main.WEBP_QUALITY),
+        "Image.save apng": lambda: save_with_pillow(imgs, "PNG"),
+        "gif": lambda: main.encode_gif(frames, 50, True),
+        "webp": lambda: main.encode_webp(frames, 50, True),
+        "webp_lossless": lambda: main.encode_webp(frames, 50, True, lossless=True),
+        "apng": lambda: main.encode_apng(frames, 50, True),
+    }
+    print(f"{'encoder':>16} {'seconds':>8} {'KB':>8} {'B/frame':>8}")
+    for name, encode in encoders.items():
+        start = time.perf_counter()
+        data = encode()
+        seconds = time.perf_counter() - start
+        print(f"{name:>16} {seconds:>8.2f} {len(data) / 1024:>8.0f} {len(data) // len(imgs):>8}")
+
+
+def save_with_pillow(imgs: List[Image.Image], format: str, **params) -> bytes:
+    """
+    Save an animation with Pillow's own serial encoder.
+    """
+    buffer = BytesIO()
+    imgs[0].save(buffer, format=format, save_all=True, append_images=imgs[1:], duration=50, loop=0, **params)
+    return buffer.getvalue()
+
+
+def bench_coldstart(runs: int = 5):
+    """
+    Measure the cold start of the command line: the median wall time of a
+    fresh interpreter importing main, of `main.py --help`, and of importing
+    main together with the GUI, skimage, scipy and seam_carving modules that
+    main only imports when they are used.
+    """
+    here = os.path.dirname(os.path.abspath(__file__))
+    commands = {
+        "import main": [sys.executable, "-c", "import main"],
+        "main.py --help": [sys.executable, "main.py", "--help"],
+        "import main + lazy": [sys.executable, "-c", "import main, tkinter.ttk, idlelib.tooltip, PIL.ImageTk, "
+                               "skimage.io, skimage.transform, scipy.ndimage, seam_carving"],
+    }
+    print(f"{'command':>20} {'median s':>9} {'min s':>7}")
+    for name, command in commands.items():
+        seconds = []
+        for _ in range(runs):
+            start = time.perf_counter()
+            subprocess.run(command, cwd=here, check=True, stdout=subprocess.DEVNULL)
+            seconds.append(time.perf_counter() - start)
+        print(f"{name:>20} {float(np.median(seconds)):>9.3f} {min(seconds):>7.3f}")
+
+
+def bench_loadtest(num_jobs: int = 40, concurrency: int = 4, size: Tuple[int, int] = (64, 64), frames: int = 8, cold_runs: int = 3):
+    """
+    Start `main.py --serve` and send it `num_jobs` small emote jobs from
+    `concurrency` clients at once, printing jobs/sec, p50/p99 latency and
+    rejections. For comparison the same job is also run `cold_runs` times
+    as a fresh `main.py` process.
+    """
+    from urllib.error import HTTPError, URLError
+    from urllib.request import urlopen
+    here = os.path.dirname(os.path.abspath(__file__))
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+    with tempfile.TemporaryDirectory() as tmp:
+        path = os.path.join(tmp, "emote.png")
+        Image.fromarray(synthetic_image(*size)).save(path)
+        job = {"input": path, "num_frames": frames, "gif_interval_msec": 50}
+
+        seconds = []
+        for _ in range(cold_runs):
+            start = time.perf_counter()
+            subprocess.run([sys.executable, "main.py", path, "--frames", str(frames)], cwd=here,
+                           check=True, stdout=subprocess.DEVNULL)
+            seconds.append(time.perf_counter() - start)
+        cold = float(np.median(seconds))
+
+        server = subprocess.Popen([sys.executable, "main.py", "-", "--serve", "--port", str(port)],
+                                  cwd=here, stdout=subprocess.DEVNULL)
+        try:
+            url = f"http://127.0.0.1:{port}"
+            # Wait until the service is up and warmed
+            while True:
+                try:
+                    urlopen(url + "/status").close()
+                    break
+                except URLError:
+                    time.sleep(0.1)
+
+            def timed_job(_):
+                start = time.perf_counter()
+                try:
+                    main.submit_job(url, job)
+                except HTTPError as e:
+                    if e.code != 503:
+                        raise
+                    return None
+                return time.perf_counter() - start
+
+            start = time.perf_counter()
+            with ThreadPoolExecutor(concurrency) as executor:
+                latencies = list(executor.map(timed_job, range(num_jobs)))
+            wall = time.perf_counter() - start
+        finally:
+            server.terminate()
+            server.wait()
+    done = [latency for latency in latencies if latency is not None]
+    print(f"cold process: {cold:.2f}s per job, {1 / cold:.1f} jobs/s")
+    print(f"warm service: {len(done) / wall:.1f} jobs/s with {concurrency} clients, "
+          f"p50 {np.percentile(done, 50):.3f}s, p99 {np.percentile(done, 99):.3f}s, "
+          f"{num_jobs - len(done)} rejected")
+
+
+def time_call(fn, repeat: int = 3) -> dict:
+    """
+    Run `fn` `repeat` times and return the median and minimum wall time.
+    """
+    seconds = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        seconds.append(time.perf_counter() - start)
+    return {"median": float(np.median(seconds)), "min": min(seconds), "runs": repeat}
+
+
+def suite_inputs(tmp: str, quick: bool = False) -> dict:
+    """
+    Write the inputs of the benchmark suite to `tmp`: synthetic and bundled
+    (skimage.data) static images and a synthetic animation, at several
+    sizes.
+
+    Returns:
+        dict: name -> path
+    """
+    from skimage import data
+    sizes = {"small": (64, 96), "medium": (192, 320)}
+    if not quick:
+        sizes["large"] = (384, 640)
+    inputs = {}
+    for name, size in sizes.items():
+        inputs[f"synthetic_{name}.png"] = synthetic_image(*size)
+        inputs[f"animated_{name}.gif"] = synthetic_gif(8, *size)
+    inputs["chelsea.png"] = data.chelsea()
+    paths = {}
+    for name, img in inputs.items():
+        path = os.path.join(tmp, name)
+        if isinstance(img, list):
+            frames = [Image.fromarray(frame) for frame in img]
+            frames[0].save(path, save_all=True, append_images=frames[1:], duration=50, loop=0)
+        else:
+            Image.fromarray(img).save(path)
+        paths[name] = path
+    return paths
+
+
+def run_suite(quick: bool = False, repeat: int = 3) -> dict:
+    """
+    Time every stage of the pipeline separately on the suite inputs:
+    load_image, seam_carving_meme per kernel and scale, resize, GIF
+    encoding, multiprocess_frames per worker count, the linear and sine
+    schedules, and process_frames with and without use_prev.
+
+    Returns:
+        dict: {"meta": {...}, "results": [{"name", "params", "median",
+            "min", "runs"}, ...]}
+    """
+    results = []
+    repeat = 1 if quick else repeat
+    scales = (0.9, 0.5) if quick else (0.9, 0.5, 0.1)
+    num_frames = 6 if quick else 12
+    worker_counts = sorted({1, 2, os.cpu_count() or 1})
+
+    def record(name: str, params: dict, fn, runs: int = repeat):
+        timing = time_call(fn, runs)
+        results.append(dict(name=name, params=params, **timing))
+        print(f"{name:>20} {json.dumps(params):<60} {timing['median']:>8.3f}s")
+
+    cwd = os.getcwd()
+    with tempfile.TemporaryDirectory() as tmp:
+        paths = suite_inputs(tmp, quick)
+        os.chdir(tmp)
+        # Do the lazy imports and JIT compilation before timing anything
+        for kernel in main.KERNELS:
+            main.seam_carving_meme(synthetic_image(16, 16), 0.5, (16, 16), kernel)
+        try:
+            for name, path in paths.items():
+                record("load_image", {"input": name}, lambda: main.load_image(path))
+
+            for name in [name for name in paths if name.endswith(".png")]:
+                main.load_image(paths[name])
+                img = main.input_image
+                shape = img.shape[:2]
+                for kernel in main.KERNELS:
+                    for scale in scales:
+                        record("seam_carving_meme", {"input": name, "kernel": kernel, "scale": scale},
+                               lambda: main.seam_carving_meme(img, scale, shape, kernel))
+
+                carved = [main.carve_frame(img, scale, shape, "incremental") for scale in scales]
+                for method in main.RESIZE_METHODS:
+                    # precision only changes the "skimage" method
+                    for precision in main.PRECISIONS if method == "skimage" else main.PRECISIONS[:1]:
+                        record("resize", {"input": name, "method": method, "precision": precision},
+                               lambda: [main.resize_carved(frame, shape, precision, method=method) for frame in carved])
+
+                frames = [main.seam_carving_meme(img, scale, shape, "pyramid", 0.0)
+                          for scale in schedule(num_frames)]
+                record("encode_gif", {"input": name, "frames": num_frames},
+                       lambda: main.encode_gif(frames, 50, True))
+
+            main.load_image(paths["synthetic_medium.png"])
+            img = main.input_image
+            shape = img.shape[:2]
+            for workers in worker_counts:
+                record("multiprocess_frames", {"input": "synthetic_medium.png", "workers": workers,
+                                               "frames": num_frames, "kernel": "incremental"},
+                       lambda: main.multiprocess_frames(num_frames, ".png", img, shape, schedule(num_frames),
+                                                        workers=workers, kernel="incremental"))
+            main.load_image(paths["animated_medium.gif"])
+            gif = main.input_image
+            for workers in worker_counts:
+                record("multiprocess_frames", {"input": "animated_medium.gif", "workers": workers,
+                                               "kernel": "incremental"},
+                       lambda: main.multiprocess_frames(len(gif), ".gif", gif, shape, schedule(len(gif)),
+                                                        workers=workers, kernel="incremental"))
+
+            for method in (1, 2):
+                scales_of_method = main.frame_scales(method, 0.0, num_frames)
+                record("schedule", {"input": "synthetic_medium.png", "method": method, "frames": num_frames},
+                       lambda: main.multiprocess_frames(num_frames, ".png", img, shape, scales_of_method,
+                                                        kernel="incremental"))
+
+            for use_prev in (False, True):
+                record("process_frames", {"input": "synthetic_small.png", "use_prev": use_prev,
+                                          "frames": num_frames, "kernel": "incremental"},
+                       lambda: main.process_frames(paths["synthetic_small.png"], 0.0, use_prev, num_frames, 2, None,
+                                                   None, True, False, 50, kernel="incremental"))
+        finally:
+            os.chdir(cwd)
+
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(os.path.abspath(__file__)),
+                                capture_output=True, text=True).stdout.strip()
+    except OSError:
+        commit = ""
+    meta = {"time": time.strftime("%Y-%m-%dT%H:%M:%S"), "commit": commit, "python": platform.python_version(),
+            "numpy": np.__version__, "platform": platform.platform(), "cpus": os.cpu_count(), "quick": quick}
+    return {"meta": meta, "results": results}
+
+
+def compare_results(old: dict, new: dict, threshold: float = 0.1, noise_seconds: float = 0.005) -> List[dict]:
+    """
+    Compare two suite runs by benchmark name and parameters. A benchmark
+    regressed if its median got more than `threshold` slower, ignoring
+    differences under `noise_seconds`.
+
+    Returns:
+        List[dict]: The regressions
+    """
+    def key(result):
+        return result["name"], json.dumps(result["params"], sort_keys=True)
+
+    old_results = {key(result): result for result in old["results"]}
+    regressions = []
+    print(f"{'benchmark':>20} {'params':<60} {'old s':>8} {'new s':>8} {'change':>8}")
+    for result in new["results"]:
+        before = old_results.get(key(result))
+        if before is None:
+            continue
+        change = result["median"] / before["median"] - 1 if before["median"] > 0 else 0.0
+        flag = ""
+        if change > threshold and result["median"] - before["median"] > noise_seconds:
+            flag = "  REGRESSION"
+            regressions.append(dict(result, old_median=before["median"], change=change))
+        elif change < -threshold and before["median"] - result["median"] > noise_seconds:
+            flag = "  faster"
+        print(f"{result['name']:>20} {json.dumps(result['params']):<60} {before['median']:>8.3f} "
+              f"{result['median']:>8.3f} {change:>+7.0%}{flag}")
+    print(f"{len(regressions)} regressions over {threshold:.0%}")
+    return regressions
+
+
+def suite_command(args: List[str]):
+    """
+    `benchmark.py suite [--quick] [--repeat N] [out.json]`: run the suite and
+    write the results as JSON (default benchmark_results.json).
+    """
+    quick = "--quick" in args
+    repeat = 3
+    if "--repeat" in args:
+        repeat = int(args[args.index("--repeat") + 1])
+        args = args[:args.index("--repeat")] + args[args.index("--repeat") + 2:]
+    paths = [arg for arg in args if not arg.startswith("--")]
+    path = paths[0] if paths else "benchmark_results.json"
+    report = run_suite(quick, repeat)
+    with open(path, "w") as fp:
+        json.dump(report, fp, indent=2)
+    print(f"results saved to {path}")
+
+
+def compare_command(args: List[str]):
+    """
+    `benchmark.py compare old.json new.json [threshold]`: print the change of
+    every benchmark and exit with 1 if any regressed.
+    """
+    if len(args) < 2:
+        print("usage: benchmark.py compare old.json new.json [threshold]")
+        exit(1)
+    with open(args[0]) as fp:
+        old = json.load(fp)
+    with open(args[1]) as fp:
+        new = json.load(fp)
+    threshold = float(args[2]) if len(args) > 2 else 0.1
+    if compare_results(old, new, threshold):
+        exit(1)
+
+
+BENCHMARKS = {
+    "progressive": bench_progressive,
+    "kernel": bench_kernel,
+    "pyramid": bench_pyramid,
+    "batch": bench_batch,
+    "resize": bench_resize,
+    "encode": bench_encode,
+    "formats": bench_formats,
+    "coldstart": bench_coldstart,
+    "loadtest": bench_loadtest,
+}
+
+
+def main_benchmark():
+    if sys.argv[1:2] == ["suite"]:
+        return suite_command(sys.argv[2:])
+    if sys.argv[1:2] == ["compare"]:
+        return compare_command(sys.argv[2:])
+    names = sys.argv[1:] or list(BENCHMARKS)
+    for name in names:
+        if name not in BENCHMARKS:
+            print(f"unknown benchmark {name}, choose from {list(BENCHMARKS)}")
+            exit(1)
+        print(f"== {name} ==")
+        BENCHMARKS[name]()
+
+
+if __name__ == "__main__":
+    main_benchmark()
@@ -0,0 +1,21 @@
+import os
+import sys
+
+import numpy as np
+import pytest
+
+# main.py is a script at the repository root, not a package
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+@pytest.fixture
+def rng():
+    return np.random.default_rng(0)
+
+
+def random_image(rng: np.random.Generator, height: int, width: int) -> np.ndarray:
+    """
+    Random uint8 RGB image. Noise has no ties in its energy, so kernels that
+    are meant to agree pick the same seams.
+    """
+    return rng.integers(0, 256, (height, width, 3), dtype=np.uint8)
@@ -0,0 +1,28 @@
+import numpy as np
+import pytest
+
+import main
+from conftest import random_image
+
+
+@pytest.mark.parametrize("height,width", [(20, 31), (25, 40), (16, 17)])
+def test_carve_batch_matches_carve_image_per_size(rng, height, width):
+    img = random_image(rng, height, width)
+    sizes = [(height, width), (height, width - 1), (height - 3, width // 2), (height // 2, width - 5), (1, 1)]
+    carved = main.carve_batch([img] * len(sizes), sizes)
+    for size, result in zip(sizes, carved):
+        np.testing.assert_array_equal(result, main.carve_image(img, *size))
+
+
+def test_carve_batch_matches_carve_image_per_frame(rng):
+    frames = [random_image(rng, 19, 27) for _ in range(4)]
+    sizes = [(19, 13), (10, 27), (15, 20), (7, 9)]
+    for frame, size, result in zip(frames, sizes, main.carve_batch(frames, sizes)):
+        np.testing.assert_array_equal(result, main.carve_image(frame, *size))
+
+
+def test_batch_kernel_matches_incremental_kernel(rng):
+    img = random_image(rng, 30, 41)
+    for scale in (0.9, 0.5, 0.0):
+        np.testing.assert_array_equal(main.carve_frame(img, scale, (30, 41), "batch"),
+                                      main.carve_frame(img, scale, (30, 41), "incremental"))
@@ -0,0 +1,125 @@
+from io import BytesIO
+
+import numpy as np
+import pytest
+from PIL import Image, ImageSequence
+
+import main
+
+# A few shades per channel, so a 255 color palette holds every color
+LEVELS = np.array([0, 85, 170, 255], dtype=np.uint8)
+
+
+@pytest.fixture
+def frames(rng):
+    """
+    Frames that change in small boxes at odd offsets, in most of the frame,
+    and not at all (frames 3 and 4 are equal).
+    """
+    frame = LEVELS[rng.integers(0, len(LEVELS), (37, 51, 3))]
+    frames = [frame]
+    for top, left, height, width in [(3, 5, 4, 7), (11, 1, 9, 3), (0, 0, 0, 0), (1, 1, 35, 49), (20, 33, 17, 18)]:
+        frame = frame.copy()
+        frame[top:top + height, left:left + width] = LEVELS[rng.integers(0, len(LEVELS), (height, width, 3))]
+        frames.append(frame)
+    return frames
+
+
+def expected_sequence(frames, interval, loop):
+    """
+    Frames and durations the animation should play: forward, then backward
+    with `loop`, with each frame equal to the previous one merged into it.
+    """
+    order = list(range(len(frames)))
+    if loop:
+        order += order[-2:0:-1]
+    expected = []
+    for i in order:
+        if expected and np.array_equal(frames[i], expected[-1][0]):
+            expected[-1][1] += interval
+        else:
+            expected.append([frames[i], interval])
+    return expected
+
+
+def decode(data: bytes):
+    """
+    Frames, durations and loop count of an animation decoded by Pillow.
+    """
+    with Image.open(BytesIO(data)) as img:
+        decoded = [(np.asarray(frame.convert("RGB")), frame.info["duration"]) for frame in ImageSequence.Iterator(img)]
+        return decoded, img.info.get("loop")
+
+
+def assert_plays(data, expected, convert=lambda frame: frame):
+    decoded, loop = decode(data)
+    assert loop == 0
+    assert [duration for _, duration in decoded] == [duration for _, duration in expected]
+    for (img, _), (frame, _) in zip(decoded, expected):
+        np.testing.assert_array_equal(img, convert(frame))
+
+
+@pytest.mark.parametrize("loop", [False, True])
+def test_lossless_webp_decodes_to_the_frames(frames, loop):
+    expected = expected_sequence(frames, 60, loop)
+    assert len(expected) == (8 if loop else 5)
+    assert_plays(main.encode_webp(frames, 60, loop, lossless=True, workers=2), expected)
+
+
+@pytest.mark.parametrize("loop", [False, True])
+def test_apng_decodes_to_the_frames(frames, loop):
+    assert_plays(main.encode_apng(frames, 60, loop, workers=2), expected_sequence(frames, 60, loop))
+
+
+def test_lossy_webp_keeps_frames_and_durations(frames):
+    decoded, loop = decode(main.encode_webp(frames, 60, True, workers=2))
+    expected = expected_sequence(frames, 60, True)
+    assert loop == 0
+    assert [duration for _, duration in decoded] == [duration for _, duration in expected]
+    for (img, _), (frame, _) in zip(decoded, expected):
+        # About as close as the frame saved as a still WebP
+        buffer = BytesIO()
+        Image.fromarray(frame).save(buffer, format="WEBP", quality=main.WEBP_QUALITY)
+        still = np.asarray(Image.open(buffer).convert("RGB"))
+        assert np.abs(img.astype(int) - frame).mean() <= 1.2 * np.abs(still.astype(int) - frame).mean()
+
+
+@pytest.mark.parametrize("loop", [False, True])
+def test_gif_decodes_to_the_palette_colors(frames, loop):
+    palette = main.gif_palette(frames, 256)
+
+    def quantized(frame):
+        # The colors encode_gif maps every pixel to
+        return np.asarray(Image.fromarray(frame).quantize(palette=palette, dither=Image.Dither.NONE).convert("RGB"))
+
+    expected = expected_sequence(frames, 60, loop)
+    assert_plays(main.encode_gif(frames, 60, loop, workers=2), expected, quantized)
+    for frame in frames:
+        assert np.abs(quantized(frame).astype(int) - frame).max() <= 2
+
+
+def test_gif_with_few_colors(rng):
+    frames = [LEVELS[rng.integers(0, 2, (20, 30, 3))] for _ in range(3)]
+    palette = main.gif_palette(frames, 16)
+    decoded, _ = decode(main.encode_gif(frames, 40, colors=16))
+    assert len(decoded) == 3
+    for (img, _), frame in zip(decoded, frames):
+        expected = Image.fromarray(frame).quantize(palette=palette, dither=Image.Dither.NONE).convert("RGB")
+        np.testing.assert_array_equal(img, np.asarray(expected))
+
+
+@pytest.mark.parametrize("loop", [False, True])
+def test_gif_stream_plays_every_frame(frames, tmp_path, loop):
+    path = str(tmp_path / "stream.gif")
+    assert main.write_gif_stream(path, iter(frames), 60, loop) == len(frames)
+    order = list(range(len(frames)))
+    if loop:
+        order += order[-2:0:-1]
+    with open(path, "rb") as fp:
+        decoded, loop_count = decode(fp.read())
+    assert loop_count == 0
+    assert len(decoded) == len(order)
+    assert all(duration == 60 for _, duration in decoded)
+    for (img, _), i in zip(decoded, order):
+        # Every frame has its own adaptive palette with room for all its colors
+        np.testing.assert_array_equal(img, frames[i])
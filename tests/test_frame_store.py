@@ -0,0 +1,78 @@
+import os
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import main
+from conftest import random_image
+
+
+@pytest.fixture
+def input_path(rng, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    Image.fromarray(random_image(rng, 30, 40)).save("input.png")
+    return "input.png"
+
+
+def carve(path: str, use_prev: bool = False, backend: str = "thread", save_frames: bool = True):
+    return main.process_frames(path, 0.0, use_prev, 6, 2, None, None, False, save_frames, 50,
+                               workers=2, backend=backend, kernel="pyramid")
+
+
+def test_store_keeps_frames_for_the_same_key(tmp_path):
+    frames, sizes = main.open_frame_store(str(tmp_path), 3, (4, 5, 3), "a", [0, 1, 2])
+    assert not sizes.any()
+    img = np.full((4, 5, 3), 7, dtype=np.uint8)
+    main.store_frame((frames, sizes), 1, img)
+    frames, sizes = main.open_frame_store(str(tmp_path), 3, (4, 5, 3), "a", [0, 1, 2])
+    assert sizes.any(axis=1).tolist() == [False, True, False]
+    np.testing.assert_array_equal(main.stored_frame((frames, sizes), 1), img)
+    frames, sizes = main.open_frame_store(str(tmp_path), 3, (4, 5, 3), "b", [0, 1, 2])
+    assert not sizes.any()
+
+
+@pytest.mark.parametrize("backend", main.BACKENDS)
+def test_resumed_run_matches_a_clean_run(input_path, backend):
+    expected = [np.asarray(img) for img in carve(input_path, backend=backend, save_frames=False)]
+    carve(input_path, backend=backend)
+    # Forget two frames as if the run had stopped before them
+    frames = np.load(os.path.join("input", "frames.npy"), mmap_mode="r+")
+    sizes = np.load(os.path.join("input", "frame_sizes.npy"), mmap_mode="r+")
+    frames[[1, 4]] = 0
+    sizes[[1, 4]] = 0
+    del frames, sizes
+    resumed = carve(input_path, backend=backend)
+    for img, reference in zip(resumed, expected):
+        np.testing.assert_array_equal(np.asarray(img), reference)
+    for i, reference in enumerate(expected):
+        np.testing.assert_array_equal(np.asarray(Image.open(os.path.join("input", f"out_{i}.png"))), reference)
+
+
+def test_recursive_run_resumes_after_the_stored_prefix(input_path):
+    expected = [np.asarray(img) for img in carve(input_path, use_prev=True, save_frames=False)]
+    carve(input_path, use_prev=True)
+    sizes = np.load(os.path.join("input", "frame_sizes.npy"), mmap_mode="r+")
+    sizes[3:] = 0
+    del sizes
+    resumed = carve(input_path, use_prev=True)
+    for img, reference in zip(resumed, expected):
+        np.testing.assert_array_equal(np.asarray(img), reference)
+
+
+def test_failed_frames_are_not_resumed(input_path, monkeypatch):
+    expected = [np.asarray(img) for img in carve(input_path, save_frames=False)]
+    carve_frame = main.timed_seam_carving_meme
+
+    def failing(img, frame_index, scale, *args):
+        if scale == main.frame_scales(2, 0.0, 6)[2]:
+            raise RuntimeError("carving failed")
+        return carve_frame(img, frame_index, scale, *args)
+
+    monkeypatch.setattr(main, "timed_seam_carving_meme", failing)
+    with pytest.raises(RuntimeError):
+        carve(input_path)
+    assert not np.load(os.path.join("input", "frame_sizes.npy"))[2].any()
+    monkeypatch.setattr(main, "timed_seam_carving_meme", carve_frame)
+    for img, reference in zip(carve(input_path), expected):
+        np.testing.assert_array_equal(np.asarray(img), reference)
@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+from skimage import transform, util
+
+import main
+from conftest import random_image
+
+
+@pytest.mark.parametrize("shape", [(13, 17), (40, 25), (64, 64), (7, 90)])
+def test_resize_lean_within_one_level_of_float64(rng, shape):
+    img = random_image(rng, 37, 51)
+    expected = util.img_as_ubyte(transform.resize(img, shape))
+    resized = main.resize_lean(img, shape)
+    assert resized.dtype == np.uint8
+    assert np.abs(resized.astype(int) - expected).max() <= 1
+
+
+def test_resize_lean_writes_into_out(rng):
+    img = random_image(rng, 30, 30)
+    out = np.zeros((20, 24, 3), dtype=np.uint8)
+    assert main.resize_lean(img, (20, 24), out) is out
+    np.testing.assert_array_equal(out, main.resize_lean(img, (20, 24)))
+
+
+@pytest.mark.parametrize("kernel", ["incremental", "pyramid"])
+def test_float32_frame_within_one_level_of_float64(rng, kernel):
+    img = random_image(rng, 33, 47)
+    frames = [main.seam_carving_meme(img, 0.6, (24, 30), kernel, precision=precision, resize_method="skimage")
+              for precision in main.PRECISIONS]
+    assert np.abs(frames[0].astype(int) - frames[1]).max() <= 1
@@ -0,0 +1,155 @@
+import os
+import re
+import signal
+import socket
+import socketserver
+import subprocess
+import sys
+import threading
+import time
+
+import numpy as np
+import pytest
+from PIL import Image
+
+import main
+from conftest import random_image
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+@pytest.fixture
+def start_node():
+    """
+    Start `main.py --node` processes on ephemeral ports and return their
+    process and host:port address.
+    """
+    procs = []
+
+    def start():
+        proc = subprocess.Popen([sys.executable, "main.py", "-", "--node", "--port", "0", "--workers", "1"],
+                                cwd=ROOT, stdout=subprocess.PIPE, text=True, start_new_session=True)
+        procs.append(proc)
+        line = proc.stdout.readline()
+        assert line.startswith("carving node on "), line
+        return proc, line.split()[3]
+
+    yield start
+    for proc in procs:
+        kill(proc)
+
+
+def kill(proc: subprocess.Popen):
+    # The node and its worker processes share a process group
+    try:
+        os.killpg(proc.pid, signal.SIGKILL)
+    except ProcessLookupError:
+        pass
+    proc.wait()
+
+
+@pytest.fixture
+def fake_node():
+    """
+    A node that says hello and takes frames and tasks, but never answers a
+    task, and the list of tasks it was sent.
+    """
+    received = []
+
+    class Handler(socketserver.BaseRequestHandler):
+        def handle(self):
+            try:
+                while True:
+                    header, _ = main.recv_message(self.request)
+                    if header["op"] == "hello":
+                        main.send_message(self.request, {"version": main.NODE_PROTOCOL_VERSION, "workers": 1})
+                    elif header["op"] == "carve":
+                        received.extend(task["task"] for task in header["tasks"])
+            except (ConnectionError, OSError):
+                pass
+
+    server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), Handler)
+    server.daemon_threads = True
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    yield f"127.0.0.1:{server.server_address[1]}", received
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def input_path(rng, tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    Image.fromarray(random_image(rng, 40, 60)).save("input.png")
+    return "input.png"
+
+
+def carve(path: str, **kwargs):
+    frames = main.process_frames(path, 0.0, False, 10, 2, None, None, False, False, 50, workers=1,
+                                 backend="thread", kernel="incremental", **kwargs)
+    return [np.asarray(img) for img in frames]
+
+
+def assert_same_frames(frames, expected):
+    assert len(frames) == len(expected)
+    for img, reference in zip(frames, expected):
+        np.testing.assert_array_equal(img, reference)
+
+
+def test_killed_node_tasks_are_carved_elsewhere(start_node, input_path, capsys):
+    expected = carve(input_path)
+    (first, first_address), (_, second_address) = start_node(), start_node()
+
+    def progress(done, total, img):
+        if done == 1:
+            kill(first)
+
+    frames = carve(input_path, nodes=[first_address, second_address], progress=progress)
+    assert_same_frames(frames, expected)
+    # It is sent the next shard before it answers, so it dies with tasks
+    assert re.search(f"node {first_address} failed, retrying its [1-9]", capsys.readouterr().out)
+
+
+def test_idle_node_steals_unanswered_tasks(start_node, fake_node, input_path, capsys):
+    expected = carve(input_path)
+    _, address = start_node()
+    fake_address, received = fake_node
+    frames = carve(input_path, nodes=[fake_address, address], node_timeout=60)
+    assert_same_frames(frames, expected)
+    assert received
+    assert f"{address} carved {len(expected)} ({len(received)} stolen)" in capsys.readouterr().out
+
+
+def test_silent_node_times_out(input_path, capsys):
+    # Accepts connections but never answers the hello
+    silent = socket.create_server(("127.0.0.1", 0))
+    silent_address = f"127.0.0.1:{silent.getsockname()[1]}"
+    start = time.perf_counter()
+    try:
+        with pytest.raises(RuntimeError, match="all 1 carving nodes failed"):
+            carve(input_path, nodes=[silent_address], node_timeout=0.5)
+    finally:
+        silent.close()
+    assert time.perf_counter() - start < 5
+    assert f"node {silent_address} failed, retrying its 0 tasks elsewhere: TimeoutError" in capsys.readouterr().out
+
+
+def test_node_answers_tasks_for_unknown_frames(start_node, rng):
+    _, address = start_node()
+    host, port = address.rsplit(":", 1)
+    img = random_image(rng, 20, 30)
+    carve_op = {"op": "carve", "resolution": [20, 30], "kernel": "incremental", "pyramid_quality": 0.5,
+                "precision": "float64", "resize_method": "separable"}
+    with socket.create_connection((host, int(port)), timeout=30) as sock:
+        main.send_message(sock, {"op": "hello"})
+        assert main.recv_message(sock)[0]["workers"] == 1
+        main.send_message(sock, dict(carve_op, tasks=[{"task": 7, "frame": 3, "scale": 0.5}]))
+        header, _ = main.recv_message(sock)
+        assert header == {"task": 7, "error": "unknown frame 3"}
+        # The node is still serving the connection
+        header, payload = main.encode_array(img)
+        main.send_message(sock, dict(header, op="frame", frame=3), payload)
+        main.send_message(sock, dict(carve_op, tasks=[{"task": 8, "frame": 3, "scale": 0.5}]))
+        header, payload = main.recv_message(sock)
+        assert header["task"] == 8
+        np.testing.assert_array_equal(main.decode_array(header, payload),
+                                      main.seam_carving_meme(img, 0.5, (20, 30), "incremental"))
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+import main
+from conftest import random_image
+
+# (input height, width) -> (output height, width): strong and slight
+# downscales, upscales, odd sizes and one unchanged axis
+CASES = [((50, 41), (20, 13)), ((37, 600), (11, 590)), ((21, 33), (64, 80)), ((45, 45), (45, 17)),
+         ((300, 7), (9, 7)), ((1, 40), (1, 25))]
+
+
+def assert_close_to_skimage(frames, shape):
+    expected = main.resize_frames(frames, shape, "skimage")
+    resized = main.resize_frames(frames, shape, "separable")
+    for result, reference in zip(resized, expected):
+        assert result.dtype == np.uint8 and result.shape == reference.shape
+        diff = np.abs(result.astype(int) - reference)
+        assert diff.max() <= 1
+        assert np.count_nonzero(diff) <= 0.01 * diff.size
+
+
+@pytest.mark.parametrize("size,shape", CASES)
+def test_separable_matches_skimage_uint8(rng, size, shape):
+    assert_close_to_skimage([random_image(rng, *size)], shape)
+
+
+@pytest.mark.parametrize("size,shape", CASES)
+def test_separable_matches_skimage_float(rng, size, shape):
+    # The library kernel carves to float images
+    assert_close_to_skimage([rng.random(size + (3,))], shape)
+
+
+def test_both_weight_layouts_are_covered():
+    assert main.resize_weights(50, 20)[1].shape[1] == 50
+    assert main.resize_weights(600, 590)[1].shape[1] < 600
+
+
+def test_mixed_sizes_keep_their_order(rng):
+    frames = [random_image(rng, 30, 40), random_image(rng, 25, 33), random_image(rng, 30, 40),
+              rng.random((30, 40, 3)), random_image(rng, 31, 17)]
+    resized = main.resize_frames(frames, (16, 20), "separable")
+    for frame, result in zip(frames, resized):
+        np.testing.assert_array_equal(result, main.resize_frames([frame], (16, 20), "separable")[0])
+    assert_close_to_skimage(frames, (16, 20))
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+
+import main
+from conftest import random_image
+
+
+@pytest.mark.parametrize("height,width", [(24, 31), (17, 40), (32, 33)])
+def test_retarget_width_matches_carve_image(rng, height, width):
+    img = random_image(rng, height, width)
+    orders = main.compute_seam_order(img)
+    for target in (width - 1, width // 2, 1):
+        expected = main.carve_image(img, height, target)
+        np.testing.assert_array_equal(main.retarget_from_order(img, *orders, height, target), expected)
+
+
+def test_retarget_full_size_is_identity(rng):
+    img = random_image(rng, 20, 27)
+    orders = main.compute_seam_order(img)
+    np.testing.assert_array_equal(main.retarget_from_order(img, *orders, 20, 27), img)
+
+
+def test_retarget_shape(rng):
+    img = random_image(rng, 21, 30)
+    orders = main.compute_seam_order(img)
+    assert main.retarget_from_order(img, *orders, 9, 13).shape == (9, 13, 3)
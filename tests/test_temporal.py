@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+from PIL import Image
+
+import main
+
+
+def scene(count: int = 12, height: int = 72, width: int = 110):
+    """Smooth gradients, a dark bar and two discs moving right."""
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    frames = []
+    for t in range(count):
+        img = np.stack([120 + 80 * np.sin(x / 23 + y / 41), 90 + 60 * np.cos(y / 17),
+                        140 + 50 * np.sin((x + y) / 31)], axis=-1)
+        for cx, cy, r, color in [(30, 30, 12, (230, 40, 40)), (80, 45, 9, (30, 200, 60))]:
+            img[(x - cx - 2 * t) ** 2 + (y - cy) ** 2 < r * r] = color
+        img[50:56, 10:100] = (20, 20, 20)
+        frames.append(np.clip(img, 0, 255).astype(np.uint8))
+    return frames
+
+
+@pytest.fixture
+def dithered_frames(tmp_path):
+    # Every frame gets its own dithered palette, like most real GIFs, so
+    # even the static background changes a little from frame to frame
+    images = [Image.fromarray(frame).quantize(64, dither=Image.Dither.FLOYDSTEINBERG) for frame in scene()]
+    path = str(tmp_path / "scene.gif")
+    images[0].save(path, save_all=True, append_images=images[1:], duration=60, loop=0)
+    return list(main.iter_gif_frames(path))
+
+
+def mean_difference(carved, frames, sizes):
+    return [float(np.abs(img.astype(int) - main.carve_image(frame, *size)).mean())
+            for img, frame, size in zip(carved, frames, sizes)]
+
+
+def test_frames_have_palette_noise(dithered_frames):
+    grays = [main.rgb_to_gray(frame) for frame in dithered_frames]
+    changed = [np.mean(np.abs(a - b) > 1) for a, b in zip(grays, grays[1:])]
+    assert min(changed) > 0.03
+
+
+def test_seams_are_reused_on_a_dithered_gif(dithered_frames):
+    sizes = [(54, 80)] * len(dithered_frames)
+    stats = {}
+    carved = main.temporal_carve(dithered_frames, sizes, stats=stats)
+    assert stats["reused"] >= 0.3 * sum(stats.values())
+    difference = mean_difference(carved, dithered_frames, sizes)
+    # The first frame has no prior and is carved exactly
+    assert difference[0] == 0
+    assert np.mean(difference) <= 4
+    assert max(difference) <= 10
+
+
+def test_tolerance_trades_reuse_for_accuracy(dithered_frames):
+    sizes = [(54, 80)] * len(dithered_frames)
+    reused = []
+    for tolerance in (0.0, main.TEMPORAL_TOLERANCE, 1.0):
+        stats = {}
+        main.temporal_carve(dithered_frames, sizes, tolerance=tolerance, stats=stats)
+        reused.append(stats["reused"])
+    assert reused == sorted(reused) and reused[0] < reused[-1]
+
+
+def test_identical_frames_reuse_every_seam():
+    frames = scene(1) * 4
+    sizes = [(50, 70)] * len(frames)
+    stats = {}
+    carved = main.temporal_carve(frames, sizes, stats=stats)
+    assert stats["full"] == 110 - 70 + 72 - 50
+    assert stats["reused"] == 3 * stats["full"] and stats["windowed"] == 0
+    for img in carved:
+        np.testing.assert_array_equal(img, main.carve_image(frames[0], 50, 70))
+
+
+def test_varying_sizes_stay_close_to_the_exact_engine(dithered_frames):
+    sizes = [main.carve_size(frame.shape[:2], scale)
+             for frame, scale in zip(dithered_frames, main.frame_scales(2, 0.3, len(dithered_frames)))]
+    difference = mean_difference(main.temporal_carve(dithered_frames, sizes), dithered_frames, sizes)
+    assert np.mean(difference) <= 4
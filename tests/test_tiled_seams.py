@@ -0,0 +1,51 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+import pytest
+
+import main
+from conftest import random_image
+
+# Widths around one and two MIN_TILE_WIDTH, where the number of tiles changes
+WIDTHS = [main.MIN_TILE_WIDTH * k + d for k in (1, 2) for d in (-1, 0, 1)] + [777]
+
+
+@pytest.fixture(params=["numba", "numpy"])
+def cost_kernel(request, monkeypatch):
+    if request.param == "numpy":
+        monkeypatch.setattr(main, "cost_tile_jit", main.fill_cost_tile)
+    return request.param
+
+
+@pytest.mark.parametrize("width", WIDTHS)
+@pytest.mark.parametrize("tiles", [2, 3])
+def test_tiled_seam_matches_serial_seam(rng, cost_kernel, width, tiles):
+    energy = rng.random((37, width), dtype=np.float32)
+    with ThreadPoolExecutor(max_workers=tiles) as executor:
+        seam = main.find_vertical_seam_tiled(energy, executor, tiles)
+    np.testing.assert_array_equal(seam, main.find_vertical_seam(energy))
+
+
+@pytest.mark.parametrize("block", [1, 5, 16, 64])
+def test_tiled_seam_matches_serial_seam_for_any_block(rng, block):
+    energy = rng.random((50, 600), dtype=np.float32)
+    with ThreadPoolExecutor(max_workers=2) as executor:
+        seam = main.find_vertical_seam_tiled(energy, executor, 2, block)
+    np.testing.assert_array_equal(seam, main.find_vertical_seam(energy))
+
+
+@pytest.mark.parametrize("width", WIDTHS)
+def test_parallel_carve_matches_one_worker(rng, width):
+    img = random_image(rng, 12, width)
+    gray = main.rgb_to_gray(img)
+    flat_idx = np.arange(gray.size, dtype=np.int32).reshape(gray.shape)
+    serial = main.carve_vertical_seams(gray, flat_idx, width - 6, 1)
+    parallel = main.carve_vertical_seams(gray, flat_idx, width - 6, 3)
+    np.testing.assert_array_equal(parallel[0], serial[0])
+    np.testing.assert_array_equal(parallel[1], serial[1])
+
+
+def test_parallel_carve_image_matches_one_worker(rng):
+    img = random_image(rng, 14, 2 * main.MIN_TILE_WIDTH + 3)
+    np.testing.assert_array_equal(main.carve_image(img, 11, 2 * main.MIN_TILE_WIDTH - 4, 4),
+                                  main.carve_image(img, 11, 2 * main.MIN_TILE_WIDTH - 4))